@@ -1,30 +1,123 @@
 import os
 import re
-import json
+import asyncio
+import argparse
+import math
+import sqlite3
+import hashlib
+import time
+import operator
+import heapq
+import functools
+import orjson
 import requests
-from typing import List, Dict
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import Counter
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Callable, List, Dict, Optional
 from dataclasses import dataclass
 from datetime import datetime
-from urllib.parse import urlparse
 from dotenv import load_dotenv
 
-from langchain.schema import HumanMessage
+from langchain.schema import HumanMessage, SystemMessage
 from langchain_groq import ChatGroq
 from pydantic import BaseModel, Field
 
 load_dotenv()
 
-@dataclass
+_MAX_CONCURRENT_REQUESTS = 2
+_MAX_CONTENT_CHARS = 500
+_LISTING_PAGE_LIMIT = 100
+
+_POST_KEYS = ('title', 'selftext', 'subreddit', 'created_utc', 'permalink')
+_get_post_fields = operator.itemgetter(*_POST_KEYS)
+_COMMENT_KEYS = ('body', 'subreddit', 'created_utc', 'permalink')
+_get_comment_fields = operator.itemgetter(*_COMMENT_KEYS)
+
+_USER_RE = re.compile(r'(?:https?://)?(?:[\w-]+\.)?reddit\.com/user/([^/?#]+)', re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+_BM25_K1 = 1.5
+_BM25_B = 0.75
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers him his how i if in into is it its just me more most my
+no nor not of off on once only or other our ours out over own same she should so some such
+than that the their theirs them then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+_CITED_PERSONA_FIELDS = (
+    'age_range', 'location', 'occupation', 'interests',
+    'personality_traits', 'goals_motivations', 'pain_points',
+    'technology_usage', 'communication_style', 'values_beliefs', 'lifestyle'
+)
+_UNSPECIFIED_VALUES = frozenset({"Not specified", "", None})
+
+_REPORT_SECTIONS = (
+    ("Interests & Hobbies", 'interests'),
+    ("Personality Traits", 'personality_traits'),
+    ("Goals & Motivations", 'goals_motivations'),
+    ("Pain Points & Frustrations", 'pain_points'),
+    ("Technology Usage", 'technology_usage'),
+    ("Communication Style", 'communication_style'),
+    ("Values & Beliefs", 'values_beliefs'),
+    ("Lifestyle", 'lifestyle'),
+)
+
+_PERSONA_SYSTEM_PROMPT = """
+You are an expert user researcher analyzing Reddit user data to create a comprehensive user persona.
+Analyze the Reddit posts and comments from the user named in the message and create a detailed user persona.
+Format your response as a valid JSON object with these exact keys:
+{
+    "name": "string",
+    "age_range": "string",
+    "location": "string",
+    "occupation": "string",
+    "interests": ["array"],
+    "personality_traits": ["array"],
+    "goals_motivations": ["array"],
+    "pain_points": ["array"],
+    "technology_usage": "string",
+    "communication_style": "string",
+    "values_beliefs": ["array"],
+    "lifestyle": "string"
+}
+IMPORTANT: Return ONLY the JSON object.
+"""
+
+_CITATION_SYSTEM_PROMPT = """
+Find the Reddit posts/comments in the message that support each of the listed persona characteristics.
+Return the post numbers (1-based) that best support each characteristic.
+Format your response as a valid JSON object mapping each field to a list of numbers:
+{"age_range": [1, 3], "interests": [2, 5]}
+IMPORTANT: Return ONLY the JSON object.
+"""
+
+_SUMMARY_ROW_FMT = (
+    "Post %d (%s):\n"
+    "Subreddit: r/%s\n"
+    "Title: %s\n"
+    "Content: %s...\n"
+    "Timestamp: %s\n"
+    "---\n"
+).__mod__
+
+@dataclass(slots=True, frozen=True)
 class RedditPost:
     title: str
     content: str
     subreddit: str
-    timestamp: str
+    timestamp: float
     post_type: str
     url: str
-    upvotes: int = 0
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Citation:
     content: str
     url: str
@@ -50,159 +143,298 @@ class PersonaWithCitations(BaseModel):
     citations: Dict[str, List[Citation]] = Field()
 
 class RedditScraper:
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, use_cache: bool = True):
+        if use_cache:
+            self.session = requests_cache.CachedSession(
+                'reddit_cache',
+                backend='sqlite',
+                expire_after=3600,
+                allowable_methods=['GET']
+            )
+        else:
+            self.session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=_MAX_CONCURRENT_REQUESTS)
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=_MAX_CONCURRENT_REQUESTS,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+                raise_on_status=False
+            )
+        ))
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
         })
 
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
     def extract_username(self, profile_url: str) -> str:
-        parsed = urlparse(profile_url)
-        path_parts = parsed.path.strip('/').split('/')
-        if 'user' in path_parts:
-            user_index = path_parts.index('user')
-            if user_index + 1 < len(path_parts):
-                return path_parts[user_index + 1]
-        raise ValueError("Invalid Reddit profile URL")
-
-    def scrape_profile(self, profile_url: str, max_posts: int = 50) -> List[RedditPost]:
+        match = _USER_RE.match(profile_url)
+        if not match:
+            raise ValueError("Invalid Reddit profile URL")
+        return match.group(1)
+
+    async def scrape_profile(self, profile_url: str, max_posts: int = 50) -> List[RedditPost]:
         username = self.extract_username(profile_url)
         posts = []
         try:
-            posts.extend(self._scrape_posts(username, max_posts // 2))
-            posts.extend(self._scrape_comments(username, max_posts // 2))
+            submitted, comments = await asyncio.gather(
+                self._scrape_posts(username, max_posts // 2),
+                self._scrape_comments(username, max_posts // 2)
+            )
+            posts.extend(submitted)
+            posts.extend(comments)
         except Exception as e:
             print(f"Error scraping profile: {e}")
         return posts
 
-    def _scrape_posts(self, username: str, max_posts: int) -> List[RedditPost]:
+    def scrape_profile_sync(self, profile_url: str, max_posts: int = 50) -> List[RedditPost]:
+        return asyncio.run(self.scrape_profile(profile_url, max_posts))
+
+    async def _get(self, url: str, params: Optional[dict] = None) -> requests.Response:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self.session.get, url, params=params))
+
+    async def _fetch_listing(self, url: str, max_items: int) -> List[dict]:
+        children = []
+        after = None
+        while len(children) < max_items:
+            params = {'limit': min(max_items - len(children), _LISTING_PAGE_LIMIT), 'raw_json': 1}
+            if after:
+                params['after'] = after
+            response = await self._get(url, params)
+            if response.status_code != 200:
+                break
+            listing = orjson.loads(response.content).get('data', {})
+            page = listing.get('children', [])
+            children.extend(page)
+            after = listing.get('after')
+            if not page or not after:
+                break
+        return children[:max_items]
+
+    async def _scrape_posts(self, username: str, max_posts: int) -> List[RedditPost]:
         posts = []
+        posts_append = posts.append
         url = f"https://www.reddit.com/user/{username}/submitted.json"
         try:
-            response = self.session.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                for post_data in data.get('data', {}).get('children', [])[:max_posts]:
-                    post = post_data.get('data', {})
-                    reddit_post = RedditPost(
-                        title=post.get('title', ''),
-                        content=post.get('selftext', ''),
-                        subreddit=post.get('subreddit', ''),
-                        timestamp=datetime.fromtimestamp(post.get('created_utc', 0)).isoformat(),
-                        post_type='post',
-                        url=f"https://www.reddit.com{post.get('permalink', '')}",
-                        upvotes=post.get('ups', 0)
-                    )
-                    posts.append(reddit_post)
+            children = await self._fetch_listing(url, max_posts)
+            for post_data in children:
+                post = post_data.get('data', {})
+                try:
+                    title, selftext, subreddit, created_utc, permalink = _get_post_fields(post)
+                except KeyError:
+                    continue
+                if not (selftext or title):
+                    continue
+                reddit_post = RedditPost(
+                    title=title,
+                    content=selftext[:_MAX_CONTENT_CHARS],
+                    subreddit=subreddit,
+                    timestamp=created_utc,
+                    post_type='post',
+                    url=f"https://www.reddit.com{permalink}"
+                )
+                posts_append(reddit_post)
         except Exception as e:
             print(f"Error scraping posts: {e}")
         return posts
 
-    def _scrape_comments(self, username: str, max_comments: int) -> List[RedditPost]:
+    async def _scrape_comments(self, username: str, max_comments: int) -> List[RedditPost]:
         comments = []
+        comments_append = comments.append
         url = f"https://www.reddit.com/user/{username}/comments.json"
         try:
-            response = self.session.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                for comment_data in data.get('data', {}).get('children', [])[:max_comments]:
-                    comment = comment_data.get('data', {})
-                    reddit_comment = RedditPost(
-                        title=f"Comment in r/{comment.get('subreddit', '')}",
-                        content=comment.get('body', ''),
-                        subreddit=comment.get('subreddit', ''),
-                        timestamp=datetime.fromtimestamp(comment.get('created_utc', 0)).isoformat(),
-                        post_type='comment',
-                        url=f"https://www.reddit.com{comment.get('permalink', '')}",
-                        upvotes=comment.get('ups', 0)
-                    )
-                    comments.append(reddit_comment)
+            children = await self._fetch_listing(url, max_comments)
+            for comment_data in children:
+                comment = comment_data.get('data', {})
+                try:
+                    body, subreddit, created_utc, permalink = _get_comment_fields(comment)
+                except KeyError:
+                    continue
+                if not body:
+                    continue
+                reddit_comment = RedditPost(
+                    title=f"Comment in r/{subreddit}",
+                    content=body[:_MAX_CONTENT_CHARS],
+                    subreddit=subreddit,
+                    timestamp=created_utc,
+                    post_type='comment',
+                    url=f"https://www.reddit.com{permalink}"
+                )
+                comments_append(reddit_comment)
         except Exception as e:
             print(f"Error scraping comments: {e}")
         return comments
 
+class LLMResponseCache:
+    def __init__(self, namespace: str, path: str = 'llm_cache.sqlite', expire_after: int = 7 * 24 * 3600):
+        self.namespace = namespace
+        self.path = path
+        self.expire_after = expire_after
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses "
+                "(key TEXT PRIMARY KEY, content TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _key(self, prompt: str) -> str:
+        normalized = " ".join(prompt.split())
+        return hashlib.sha256(f"{self.namespace}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def get(self, prompt: str) -> Optional[str]:
+        with closing(sqlite3.connect(self.path)) as conn:
+            row = conn.execute(
+                "SELECT content FROM llm_responses WHERE key = ? AND created_at > ?",
+                (self._key(prompt), time.time() - self.expire_after)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, prompt: str, content: str) -> None:
+        now = time.time()
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute("DELETE FROM llm_responses WHERE created_at <= ?", (now - self.expire_after,))
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, content, created_at) VALUES (?, ?, ?)",
+                (self._key(prompt), content, now)
+            )
+
 class PersonaAnalyzer:
-    def __init__(self):
+    def __init__(self, use_llm_ranking: bool = False, use_cache: bool = True):
+        self.use_llm_ranking = use_llm_ranking
         self.llm = ChatGroq(
             groq_api_key=os.getenv('GROQ_API_KEY'),
             model_name="llama3-70b-8192",
             temperature=0.1
         )
+        self.cache = LLMResponseCache(namespace=self.llm.model_name) if use_cache else None
+
+    def _cached(self, system_prompt: str, prompt: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.get(f"{system_prompt}\n{prompt}")
+
+    def _store(self, system_prompt: str, prompt: str, content: str) -> None:
+        if self.cache is not None:
+            self.cache.set(f"{system_prompt}\n{prompt}", content)
+
+    def _invoke(self, system_prompt: str, prompt: str, validate: Callable[[str], object]) -> str:
+        cached = self._cached(system_prompt, prompt)
+        if cached is not None:
+            return cached
+        response = self.llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=prompt)])
+        self._log_prompt_cache(response)
+        try:
+            validate(response.content)
+        except Exception:
+            return response.content
+        self._store(system_prompt, prompt, response.content)
+        return response.content
+
+    def _log_prompt_cache(self, response) -> None:
+        usage = response.response_metadata.get('token_usage') or response.response_metadata.get('usage') or {}
+        details = usage.get('prompt_tokens_details') or {}
+        cached_tokens = usage.get('cached_tokens') or details.get('cached_tokens')
+        if cached_tokens:
+            print(f"Prompt cache hit: {cached_tokens} cached tokens")
 
     def analyze_persona(self, posts: List[RedditPost], username: str) -> PersonaWithCitations:
+        return asyncio.run(self.aanalyze_persona(posts, username))
+
+    async def aanalyze_persona(self, posts: List[RedditPost], username: str) -> PersonaWithCitations:
         content_summary = self._prepare_content_summary(posts)
         persona_prompt = self._create_persona_prompt(content_summary, username)
-        persona_response = self.llm.invoke([HumanMessage(content=persona_prompt)])
-        persona = self._parse_persona_response(persona_response.content)
-        citations = self._generate_citations(persona, posts)
+        loop = asyncio.get_running_loop()
+        index_future = None
+        if not self.use_llm_ranking:
+            index_future = loop.run_in_executor(None, self._build_bm25_index, posts)
+        persona_response = await loop.run_in_executor(
+            None, self._invoke, _PERSONA_SYSTEM_PROMPT, persona_prompt, self._build_persona
+        )
+        persona = self._parse_persona_response(persona_response)
+        if index_future is not None:
+            citations = self._generate_citations(persona, posts, await index_future)
+        else:
+            citations = await loop.run_in_executor(
+                None, self._generate_citations, persona, posts, None, content_summary
+            )
         return PersonaWithCitations(persona=persona, citations=citations)
 
     def _prepare_content_summary(self, posts: List[RedditPost]) -> str:
-        summary = []
-        for i, post in enumerate(posts[:30]):
-            summary.append(
-                f"Post {i+1} ({post.post_type}):\n"
-                f"Subreddit: r/{post.subreddit}\n"
-                f"Title: {post.title}\n"
-                f"Content: {post.content[:500]}...\n"
-                f"Timestamp: {post.timestamp}\n"
-                f"---\n"
-            )
-        return "\n".join(summary)
+        fromtimestamp = datetime.fromtimestamp
+        return "\n".join(
+            _SUMMARY_ROW_FMT((
+                i, post.post_type, post.subreddit, post.title, post.content[:_MAX_CONTENT_CHARS],
+                fromtimestamp(post.timestamp or 0).isoformat(timespec='seconds')
+            ))
+            for i, post in enumerate(islice(posts, 30), 1)
+        )
 
     def _create_persona_prompt(self, content_summary: str, username: str) -> str:
-        return f"""
-        You are an expert user researcher analyzing Reddit user data to create a comprehensive user persona.
-        Analyze the following Reddit posts and comments from user '{username}' and create a detailed user persona.
-        REDDIT CONTENT:
-        {content_summary}
-        Format your response as a valid JSON object with these exact keys:
-        {{
-            "name": "string",
-            "age_range": "string", 
-            "location": "string",
-            "occupation": "string",
-            "interests": ["array"],
-            "personality_traits": ["array"],
-            "goals_motivations": ["array"],
-            "pain_points": ["array"],
-            "technology_usage": "string",
-            "communication_style": "string", 
-            "values_beliefs": ["array"],
-            "lifestyle": "string"
-        }}
-        IMPORTANT: Return ONLY the JSON object.
-        """
+        return f"USER: {username}\nREDDIT CONTENT:\n{content_summary}"
+
+    def _find_json_object(self, text: str) -> tuple:
+        start_idx = text.find('{')
+        if start_idx == -1:
+            raise ValueError("No valid JSON found in response")
+        depth = 0
+        in_string = False
+        escaped = False
+        for idx in range(start_idx, len(text)):
+            char = text[idx]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    return start_idx, idx + 1
+        raise ValueError("Unbalanced JSON object in response")
+
+    def _extract_json(self, response: str) -> dict:
+        start_idx, end_idx = self._find_json_object(response)
+        json_str = response[start_idx:end_idx]
+        try:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError:
+            return orjson.loads(_TRAILING_COMMA_RE.sub(r'\1', json_str))
+
+    def _build_persona(self, response: str) -> UserPersona:
+        persona_data = self._extract_json(response)
+        defaults = {
+            "name": "Unknown User",
+            "age_range": "Not specified",
+            "location": "Not specified", 
+            "occupation": "Not specified",
+            "interests": ["Not specified"],
+            "personality_traits": ["Not specified"],
+            "goals_motivations": ["Not specified"],
+            "pain_points": ["Not specified"],
+            "technology_usage": "Not specified",
+            "communication_style": "Not specified",
+            "values_beliefs": ["Not specified"],
+            "lifestyle": "Not specified"
+        }
+        for key, default_value in defaults.items():
+            if key not in persona_data or not persona_data[key]:
+                persona_data[key] = default_value
+        return UserPersona(**persona_data)
 
     def _parse_persona_response(self, response: str) -> UserPersona:
         try:
-            response = response.strip()
-            start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
-            if start_idx == -1 or end_idx == 0:
-                raise ValueError("No valid JSON found in response")
-            json_str = response[start_idx:end_idx]
-            json_str = re.sub(r',\s*}', '}', json_str)
-            json_str = re.sub(r',\s*]', ']', json_str)
-            persona_data = json.loads(json_str)
-            defaults = {
-                "name": "Unknown User",
-                "age_range": "Not specified",
-                "location": "Not specified", 
-                "occupation": "Not specified",
-                "interests": ["Not specified"],
-                "personality_traits": ["Not specified"],
-                "goals_motivations": ["Not specified"],
-                "pain_points": ["Not specified"],
-                "technology_usage": "Not specified",
-                "communication_style": "Not specified",
-                "values_beliefs": ["Not specified"],
-                "lifestyle": "Not specified"
-            }
-            for key, default_value in defaults.items():
-                if key not in persona_data or not persona_data[key]:
-                    persona_data[key] = default_value
-            return UserPersona(**persona_data)
+            return self._build_persona(response)
         except Exception as e:
             print(f"Error parsing persona response: {e}")
             return UserPersona(**{
@@ -220,38 +452,120 @@ class PersonaAnalyzer:
                 "lifestyle": "Not specified"
             })
 
-    def _generate_citations(self, persona: UserPersona, posts: List[RedditPost]) -> Dict[str, List[Citation]]:
+    def _generate_citations(self, persona: UserPersona, posts: List[RedditPost], index: Optional[tuple] = None,
+                            content_summary: Optional[str] = None) -> Dict[str, List[Citation]]:
         citations = {}
-        persona_fields = [
-            'age_range', 'location', 'occupation', 'interests',
-            'personality_traits', 'goals_motivations', 'pain_points',
-            'technology_usage', 'communication_style', 'values_beliefs', 'lifestyle'
-        ]
-        for field in persona_fields:
-            field_value = getattr(persona, field)
-            if field_value and field_value != "Not specified":
-                citations[field] = self._find_relevant_posts(field, field_value, posts)
+        field_values = {}
+        persona_data = persona.model_dump()
+        for field in _CITED_PERSONA_FIELDS:
+            field_value = persona_data[field]
+            if self._is_specified(field_value):
+                field_values[field] = field_value
+        if not field_values:
+            return citations
+        relevant_indices: Dict[tuple, List[int]] = {}
+        snippets: Dict[str, str] = {}
+        self._rank_relevant_posts(field_values, posts, relevant_indices, index, content_summary)
+        for field, field_value in field_values.items():
+            citations[field] = self._find_relevant_posts(field, field_value, posts, relevant_indices, snippets)
         return citations
 
-    def _find_relevant_posts(self, field: str, field_value, posts: List[RedditPost]) -> List[Citation]:
+    def _is_specified(self, value) -> bool:
+        if isinstance(value, list):
+            return any(item not in _UNSPECIFIED_VALUES for item in value)
+        return value not in _UNSPECIFIED_VALUES
+
+    def _rank_relevant_posts(self, field_values: Dict[str, object], posts: List[RedditPost],
+                             relevant_indices: Dict[tuple, List[int]], index: Optional[tuple] = None,
+                             content_summary: Optional[str] = None) -> None:
+        if self.use_llm_ranking:
+            self._rank_relevant_posts_llm(
+                field_values, relevant_indices, content_summary or self._prepare_content_summary(posts)
+            )
+        else:
+            self._rank_relevant_posts_bm25(field_values, relevant_indices, index or self._build_bm25_index(posts))
+
+    def _tokenize(self, text: str) -> List[str]:
+        return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOP_WORDS]
+
+    def _build_bm25_index(self, posts: List[RedditPost]) -> tuple:
+        documents = [Counter(self._tokenize(f"{post.subreddit} {post.title} {post.content}")) for post in posts]
+        doc_count = len(documents)
+        doc_lengths = [sum(doc.values()) for doc in documents]
+        avg_length = sum(doc_lengths) / doc_count if doc_count else 0.0
+        length_norms = [
+            _BM25_K1 * (1 - _BM25_B + _BM25_B * length / avg_length) if avg_length else _BM25_K1
+            for length in doc_lengths
+        ]
+        doc_freq = Counter(term for doc in documents for term in doc)
+        idf = {term: math.log((doc_count - df + 0.5) / (df + 0.5) + 1) for term, df in doc_freq.items()}
+        postings: Dict[str, List[tuple]] = {}
+        for idx, doc in enumerate(documents):
+            norm = length_norms[idx]
+            for term, count in doc.items():
+                postings.setdefault(term, []).append((idx, idf[term] * count * (_BM25_K1 + 1) / (count + norm)))
+        return postings, doc_count
+
+    def _rank_relevant_posts_bm25(self, field_values: Dict[str, object], relevant_indices: Dict[tuple, List[int]],
+                                  index: tuple) -> None:
+        postings, doc_count = index
+        for field, value in field_values.items():
+            text = " ".join(value) if isinstance(value, list) else str(value)
+            scores = [0.0] * doc_count
+            for term in set(self._tokenize(f"{field} {text}")):
+                for idx, weight in postings.get(term, ()):
+                    scores[idx] += weight
+            candidates = (idx for idx, score in enumerate(scores) if score > 0)
+            relevant_indices[(field, str(value))] = heapq.nlargest(3, candidates, key=scores.__getitem__)
+
+    def _rank_relevant_posts_llm(self, field_values: Dict[str, object], relevant_indices: Dict[tuple, List[int]],
+                                 content_summary: str) -> None:
+        characteristics = "\n".join(f"- {field}: {value}" for field, value in field_values.items())
+        search_prompt = (
+            f"REDDIT CONTENT:\n{content_summary}\n"
+            f"CHARACTERISTICS:\n{characteristics}"
+        )
+        try:
+            response = self._invoke(_CITATION_SYSTEM_PROMPT, search_prompt, self._parse_ranking)
+            ranking = self._parse_ranking(response)
+        except Exception as e:
+            print(f"Error ranking relevant posts: {e}")
+            ranking = {}
+        for field, value in field_values.items():
+            numbers = ranking.get(field) or []
+            if not isinstance(numbers, list):
+                numbers = [numbers]
+            relevant_indices[(field, str(value))] = [
+                int(n) - 1 for n in numbers if str(n).strip().isdigit()
+            ]
+
+    def _parse_ranking(self, response: str) -> dict:
+        ranking = self._extract_json(response)
+        if not isinstance(ranking, dict) or not all(
+            isinstance(numbers, (list, int, str)) for numbers in ranking.values()
+        ):
+            raise ValueError("Ranking response is not a mapping of fields to post numbers")
+        return ranking
+
+    def _find_relevant_posts(self, field: str, field_value, posts: List[RedditPost],
+                             relevant_indices: Optional[Dict[tuple, List[int]]] = None,
+                             snippets: Optional[Dict[str, str]] = None) -> List[Citation]:
         relevant_posts = []
-        search_prompt = f"""
-        Find Reddit posts/comments that support this persona characteristic:
-        Field: {field}
-        Value: {field_value}
-        From these posts, identify the most relevant ones:
-        {self._prepare_content_summary(posts[:10])}
-        Return the post numbers (1-based) that best support this characteristic.
-        Format: Just list the numbers separated by commas (e.g., "1, 3, 5")
-        """
+        key = (field, str(field_value))
+        if relevant_indices is None:
+            relevant_indices = {}
+        if snippets is None:
+            snippets = {}
         try:
-            response = self.llm.invoke([HumanMessage(content=search_prompt)])
-            relevant_indices = [int(x.strip()) - 1 for x in response.content.split(',') if x.strip().isdigit()]
-            for idx in relevant_indices[:3]:
+            if key not in relevant_indices:
+                self._rank_relevant_posts({field: field_value}, posts, relevant_indices)
+            for idx in relevant_indices[key][:3]:
                 if 0 <= idx < len(posts):
                     post = posts[idx]
+                    if post.url not in snippets:
+                        snippets[post.url] = f"{post.title}: {post.content[:200]}..."
                     citation = Citation(
-                        content=f"{post.title}: {post.content[:200]}...",
+                        content=snippets[post.url],
                         url=post.url,
                         post_type=post.post_type,
                         relevance=f"Supports {field}: {field_value}"
@@ -263,65 +577,35 @@ class PersonaAnalyzer:
 
 class PersonaReportGenerator:
     def generate_report(self, persona_data: PersonaWithCitations, username: str) -> str:
-        report = f"""
+        persona = persona_data.persona
+        now = datetime.now()
+        parts = [f"""
 # User Persona Analysis Report
 ## Reddit User: {username}
-## Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+## Generated on: {now.strftime('%Y-%m-%d %H:%M:%S')}
 
 ---
 
 ## User Persona Overview
 
-**Name:** {persona_data.persona.name}
-**Age Range:** {persona_data.persona.age_range}
-**Location:** {persona_data.persona.location}
-**Occupation:** {persona_data.persona.occupation}
+**Name:** {persona.name}
+**Age Range:** {persona.age_range}
+**Location:** {persona.location}
+**Occupation:** {persona.occupation}
 
 ---
 
 ## Detailed Characteristics
 
-### Interests & Hobbies
-{self._format_list(persona_data.persona.interests)}
-
-{self._format_citations('interests', persona_data.citations)}
-
-### Personality Traits
-{self._format_list(persona_data.persona.personality_traits)}
-
-{self._format_citations('personality_traits', persona_data.citations)}
-
-### Goals & Motivations
-{self._format_list(persona_data.persona.goals_motivations)}
-
-{self._format_citations('goals_motivations', persona_data.citations)}
-
-### Pain Points & Frustrations
-{self._format_list(persona_data.persona.pain_points)}
-
-{self._format_citations('pain_points', persona_data.citations)}
-
-### Technology Usage
-{persona_data.persona.technology_usage}
-
-{self._format_citations('technology_usage', persona_data.citations)}
-
-### Communication Style
-{persona_data.persona.communication_style}
-
-{self._format_citations('communication_style', persona_data.citations)}
-
-### Values & Beliefs
-{self._format_list(persona_data.persona.values_beliefs)}
-
-{self._format_citations('values_beliefs', persona_data.citations)}
-
-### Lifestyle
-{persona_data.persona.lifestyle}
-
-{self._format_citations('lifestyle', persona_data.citations)}
-
----
+"""]
+        for heading, field in _REPORT_SECTIONS:
+            value = getattr(persona, field)
+            parts.append(f"### {heading}\n")
+            parts.append(self._format_list(value) if isinstance(value, list) else value)
+            parts.append("\n\n")
+            parts.append(self._format_citations(field, persona_data.citations))
+            parts.append("\n\n")
+        parts.append(f"""---
 
 ## Summary
 
@@ -329,9 +613,9 @@ This persona was generated by analyzing Reddit posts and comments from user {use
 The analysis used natural language processing to identify patterns in communication style,
 interests, values, and behavior to create a comprehensive user profile.
 
-**Analysis Date:** {datetime.now().strftime('%Y-%m-%d')}
-"""
-        return report
+**Analysis Date:** {now.strftime('%Y-%m-%d')}
+""")
+        return "".join(parts)
 
     def _format_list(self, items: List[str]) -> str:
         if not items or (len(items) == 1 and items[0] == "Not specified"):
@@ -339,16 +623,24 @@ interests, values, and behavior to create a comprehensive user profile.
         return "\n".join([f"- {item}" for item in items])
 
     def _format_citations(self, field: str, citations: Dict[str, List[Citation]]) -> str:
-        if field not in citations or not citations[field]:
+        if not citations.get(field):
             return "\n**Sources:** No specific citations available\n"
-        citation_text = "\n**Sources:**\n"
+        parts = ["\n**Sources:**\n"]
         for i, citation in enumerate(citations[field], 1):
-            citation_text += f"{i}. {citation.content}\n"
-            citation_text += f"   Source: {citation.url}\n"
-            citation_text += f"   Type: {citation.post_type}\n\n"
-        return citation_text
+            parts.append(f"{i}. {citation.content}\n")
+            parts.append(f"   Source: {citation.url}\n")
+            parts.append(f"   Type: {citation.post_type}\n\n")
+        return "".join(parts)
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate a user persona from a Reddit profile")
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="fetch fresh data instead of using cached Reddit and LLM responses"
+    )
+    args = parser.parse_args()
+
     if not os.getenv('GROQ_API_KEY'):
         print("Error: GROQ_API_KEY environment variable not set")
         return
@@ -359,14 +651,15 @@ def main():
         print("Error: No profile URL provided")
         return
 
+    scraper = None
     try:
-        scraper = RedditScraper()
-        analyzer = PersonaAnalyzer()
+        scraper = RedditScraper(use_cache=not args.no_cache)
+        analyzer = PersonaAnalyzer(use_cache=not args.no_cache)
         report_generator = PersonaReportGenerator()
         username = scraper.extract_username(profile_url)
         print(f"Analyzing profile for user: {username}")
         print("Scraping Reddit profile...")
-        posts = scraper.scrape_profile(profile_url)
+        posts = scraper.scrape_profile_sync(profile_url)
 
         if not posts:
             print("Error: No posts found. The profile might be private or doesn't exist.")
@@ -383,6 +676,9 @@ def main():
         print(f"Persona report saved to: {output_filename}")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        if scraper is not None:
+            scraper.close()
 
 if __name__ == "__main__":
     main()